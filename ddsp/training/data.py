@@ -15,6 +15,8 @@
 # Lint as: python3
 """Library of functions to help loading data."""
 
+import os
+
 from absl import logging
 import gin
 import tensorflow.compat.v2 as tf
@@ -23,14 +25,69 @@ import tensorflow_datasets as tfds
 _AUTOTUNE = tf.data.experimental.AUTOTUNE
 
 
+def _get_num_cpus():
+  """Number of CPUs this process may run on, respecting affinity limits."""
+  if hasattr(os, 'sched_getaffinity'):
+    return len(os.sched_getaffinity(0))
+  return os.cpu_count() or 1
+
+
 # ---------- Base Class --------------------------------------------------------
 class DataProvider(object):
   """Base class for returning a dataset."""
 
-  def get_dataset(self, shuffle):
-    """A method that returns a tf.data.Dataset."""
+  # Default for subclasses that don't call DataProvider.__init__().
+  _ram_budget = None
+
+  def __init__(self, ram_budget=None):
+    """DataProvider constructor.
+
+    Args:
+      ram_budget: Optional limit in bytes on the host memory that tf.data
+        autotuning may use for buffers in `get_batch`. Uses the tf.data default
+        if None.
+    """
+    self._ram_budget = ram_budget
+
+  def get_records(self, shuffle):
+    """A method that returns a tf.data.Dataset of unprocessed records.
+
+    Subclasses should override this together with `get_preprocess_fn`. For
+    backwards compatibility, `get_batch` instead batches the examples from
+    `get_dataset` directly if a subclass overrides it.
+    """
     raise NotImplementedError
 
+  def _overrides_get_dataset(self):
+    """Whether a subclass overrides `get_dataset` (legacy providers)."""
+    return type(self).get_dataset is not DataProvider.get_dataset
+
+  def get_preprocess_fn(self):
+    """Returns a function mapping records to a dictionary of features.
+
+    The function must accept either a single record or a batch of records.
+    Returns None if the records need no preprocessing.
+    """
+    return None
+
+  def get_dataset(self, shuffle=True):
+    """Read dataset.
+
+    Args:
+      shuffle: Whether to shuffle the input files.
+
+    Returns:
+      dataset: A tf.data.Dataset of preprocessed examples.
+    """
+    dataset = self.get_records(shuffle)
+    preprocess_fn = self.get_preprocess_fn()
+    if preprocess_fn is not None:
+      # Preprocess in chunks of records to amortize per-call overhead.
+      dataset = dataset.batch(64)
+      dataset = dataset.map(preprocess_fn, num_parallel_calls=_AUTOTUNE)
+      dataset = dataset.unbatch()
+    return dataset
+
   def get_batch(self, batch_size, shuffle=True, repeats=-1):
     """Read dataset.
 
@@ -42,17 +99,40 @@ class DataProvider(object):
     Returns:
       A batched tf.data.Dataset.
     """
-    dataset = self.get_dataset(shuffle)
+    if self._overrides_get_dataset():
+      # Examples from an overridden get_dataset are already preprocessed.
+      dataset = self.get_dataset(shuffle)
+      preprocess_fn = None
+    else:
+      dataset = self.get_records(shuffle)
+      preprocess_fn = self.get_preprocess_fn()
+
     dataset = dataset.repeat(repeats)
+    if shuffle:
+      # Shuffle unprocessed records, before parsing and batching. Shuffling
+      # after repeat fills the buffer once instead of at every epoch.
+      dataset = dataset.shuffle(buffer_size=512)
     dataset = dataset.batch(batch_size, drop_remainder=True)
+    if preprocess_fn is not None:
+      # Preprocess whole batches of records at once.
+      dataset = dataset.map(preprocess_fn, num_parallel_calls=_AUTOTUNE)
     dataset = dataset.prefetch(buffer_size=_AUTOTUNE)
+
+    options = tf.data.Options()
+    # Copy records into each batch in parallel.
+    options.experimental_optimization.parallel_batch = True
+    if self._ram_budget is not None:
+      options.autotune.ram_budget = self._ram_budget
+    if shuffle:
+      options.deterministic = False
+    dataset = dataset.with_options(options)
     return dataset
 
 
 class TfdsProvider(DataProvider):
   """Base class for reading datasets from TensorFlow Datasets (TFDS)."""
 
-  def __init__(self, name, split, data_dir):
+  def __init__(self, name, split, data_dir, cache_path=None, ram_budget=None):
     """TfdsProvider constructor.
 
     Args:
@@ -60,12 +140,24 @@ class TfdsProvider(DataProvider):
       split: Dataset split to use of the TFDS dataset.
       data_dir: The directory to read TFDS datasets from. Defaults to
         "~/tensorflow_datasets".
+      cache_path: Optional path prefix to cache the decoded dataset to after
+        the first epoch. An empty string caches in memory. No caching if None.
+        Only applies when shuffling, as unshuffled reads (eval, sampling)
+        often stop before the cache is complete. The first epoch's file order
+        is cached, so later epochs are only mixed by the example shuffle
+        buffer. If a run stops before finishing its first epoch, delete the
+        leftover `<cache_path>*.lockfile` before restarting, otherwise reading
+        fails with AlreadyExistsError.
+      ram_budget: Optional limit in bytes on the host memory used by tf.data
+        autotuning. Uses the tf.data default if None.
     """
+    super().__init__(ram_budget)
     self._name = name
     self._split = split
     self._data_dir = data_dir
+    self._cache_path = cache_path
 
-  def get_dataset(self, shuffle=True):
+  def get_records(self, shuffle=True):
     """Read dataset.
 
     Args:
@@ -74,12 +166,20 @@ class TfdsProvider(DataProvider):
     Returns:
       dataset: A tf.data.Dataset that reads from TFDS.
     """
-    return tfds.load(
+    dataset = tfds.load(
         self._name,
         data_dir=self._data_dir,
         split=self._split,
         shuffle_files=shuffle,
         download=False)
+    if self._cache_path is not None:
+      if shuffle:
+        dataset = dataset.cache(self._cache_path)
+      else:
+        logging.warning(
+            'Ignoring cache_path for unshuffled dataset %s, as partial reads '
+            'would never complete the cache.', self._name)
+    return dataset
 
 
 @gin.register
@@ -93,7 +193,9 @@ class NSynthTfds(TfdsProvider):
   def __init__(self,
                name='nsynth/gansynth_subset.f0_and_loudness:2.3.0',
                split='train',
-               data_dir='gs://tfds-data/datasets'):
+               data_dir='gs://tfds-data/datasets',
+               cache_path=None,
+               ram_budget=None):
     """TfdsProvider constructor.
 
     Args:
@@ -101,16 +203,26 @@ class NSynthTfds(TfdsProvider):
       split: Dataset split to use of the TFDS dataset.
       data_dir: The directory to read the prepared NSynth dataset from. Defaults
         to the public TFDS GCS bucket.
+      cache_path: Optional path prefix to cache the decoded dataset to after
+        the first epoch, avoiding repeated reads from `data_dir`. Use a
+        different path for each split. An empty string caches in memory. No
+        caching if None. Only applies when shuffling (training). The first
+        epoch's file order is cached, so later epochs are only mixed by the
+        example shuffle buffer. If a run stops before finishing its first
+        epoch, delete the leftover `<cache_path>*.lockfile` before restarting,
+        otherwise reading fails with AlreadyExistsError.
+      ram_budget: Optional limit in bytes on the host memory used by tf.data
+        autotuning. Uses the tf.data default if None.
     """
     if data_dir == 'gs://tfds-data/datasets':
       logging.warning(
           'Using public TFDS GCS bucket to load NSynth. If not running on '
           'GCP, this will be very slow, and it is recommended you prepare '
           'the dataset locally with TFDS and set the data_dir appropriately.')
-    super().__init__(name, split, data_dir)
+    super().__init__(name, split, data_dir, cache_path, ram_budget)
 
-  def get_dataset(self, shuffle=True):
-    """Returns dataset with slight restructuring of feature dictionary."""
+  def get_preprocess_fn(self):
+    """Returns function with slight restructuring of feature dictionary."""
     def preprocess_ex(ex):
       return {
           'pitch':
@@ -130,9 +242,7 @@ class NSynthTfds(TfdsProvider):
           'loudness_db':
               ex['loudness']['db'],
       }
-    dataset = super().get_dataset(shuffle)
-    dataset = dataset.map(preprocess_ex, num_parallel_calls=_AUTOTUNE)
-    return dataset
+    return preprocess_ex
 
 
 @gin.register
@@ -143,11 +253,34 @@ class TFRecordProvider(DataProvider):
                file_pattern=None,
                example_secs=4,
                sample_rate=16000,
-               frame_rate=250):
-    """TFRecordProvider constructor."""
+               frame_rate=250,
+               compression_type=None,
+               read_buffer_size=None,
+               ram_budget=None):
+    """TFRecordProvider constructor.
+
+    Args:
+      file_pattern: Glob pattern of the TFRecord files to read.
+      example_secs: Length of each example in seconds.
+      sample_rate: Sample rate of the audio.
+      frame_rate: Frame rate of the f0 and loudness features.
+      compression_type: Compression of the TFRecord files, 'GZIP', 'ZLIB', or
+        None for uncompressed.
+      read_buffer_size: Bytes to buffer when reading each file. Up to 40
+        files are read at once, each with its own buffer. If None, uses 16MB
+        for remote files (e.g. 'gs://'), to issue fewer, larger reads, and
+        the TFRecordDataset default for local files.
+      ram_budget: Optional limit in bytes on the host memory used by tf.data
+        autotuning. Uses the tf.data default if None.
+    """
+    super().__init__(ram_budget)
     self._file_pattern = file_pattern or self.default_file_pattern
     self._audio_length = example_secs * sample_rate
     self._feature_length = example_secs * frame_rate
+    self._compression_type = compression_type
+    if read_buffer_size is None and '://' in self._file_pattern:
+      read_buffer_size = 16 * 1024 * 1024
+    self._read_buffer_size = read_buffer_size
 
   @property
   def default_file_pattern(self):
@@ -156,26 +289,48 @@ class TFRecordProvider(DataProvider):
         'You must pass a "file_pattern" argument to the constructor or '
         'choose a FileDataProvider with a default_file_pattern.')
 
-  def get_dataset(self, shuffle=True):
+  def get_records(self, shuffle=True):
     """Read dataset.
 
     Args:
       shuffle: Whether to shuffle the files.
 
     Returns:
-      dataset: A tf.dataset that reads from the TFRecord.
+      dataset: A tf.dataset of serialized records read from the TFRecord.
     """
-    def parse_tfexample(record):
-      return tf.io.parse_single_example(record, self.features_dict)
+    def read_tfrecord(filename):
+      return tf.data.TFRecordDataset(filename,
+                                     compression_type=self._compression_type,
+                                     buffer_size=self._read_buffer_size)
+
+    if shuffle:
+      # Reads are IO bound, so read from up to twice as many files as CPUs.
+      cycle_length = min(40, max(4, 2 * _get_num_cpus()))
+    else:
+      # Interleave order depends on cycle_length, keep it fixed so unshuffled
+      # reads (eval, sampling) see the same examples on every machine.
+      cycle_length = 40
 
     filenames = tf.data.Dataset.list_files(self._file_pattern, shuffle=shuffle)
     dataset = filenames.interleave(
-        map_func=tf.data.TFRecordDataset,
-        cycle_length=40,
+        map_func=read_tfrecord,
+        cycle_length=cycle_length,
         num_parallel_calls=_AUTOTUNE)
-    dataset = dataset.map(parse_tfexample, num_parallel_calls=_AUTOTUNE)
+
+    if shuffle:
+      # File order is already random, so let interleave return records from
+      # whichever file is ready rather than blocking on a slow shard.
+      options = tf.data.Options()
+      options.deterministic = False
+      dataset = dataset.with_options(options)
     return dataset
 
+  def get_preprocess_fn(self):
+    """Returns function that parses one or a batch of serialized tf.Examples."""
+    def parse_tfexample(records):
+      return tf.io.parse_example(records, self.features_dict)
+    return parse_tfexample
+
   @property
   def features_dict(self):
     """Dictionary of features to read from dataset."""
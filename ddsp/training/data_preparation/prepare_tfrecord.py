@@ -59,6 +59,9 @@ flags.DEFINE_float(
     'sliding_window_hop_secs', 1,
     'The hop size in seconds to use when splitting audio into constant-length '
     'examples.')
+flags.DEFINE_boolean(
+    'gzip', False,
+    'Whether to GZIP compress the output TFRecord.')
 flags.DEFINE_list(
     'pipeline_options', '--runner=DirectRunner',
     'A comma-separated list of command line arguments to be used as options '
@@ -78,7 +81,8 @@ def run():
       frame_rate=FLAGS.frame_rate,
       window_secs=FLAGS.example_secs,
       hop_secs=FLAGS.sliding_window_hop_secs,
-      pipeline_options=FLAGS.pipeline_options)
+      pipeline_options=FLAGS.pipeline_options,
+      gzip=FLAGS.gzip)
 
 
 def main(unused_argv):
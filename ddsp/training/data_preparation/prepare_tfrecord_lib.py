@@ -154,7 +154,8 @@ def prepare_tfrecord(
     frame_rate=250,
     window_secs=4,
     hop_secs=1,
-    pipeline_options=''):
+    pipeline_options='',
+    gzip=False):
   """Prepares a TFRecord for use in training, evaluation, and prediction.
 
   Args:
@@ -173,9 +174,13 @@ def prepare_tfrecord(
       windows.
     pipeline_options: An iterable of command line arguments to be used as
       options for the Beam Pipeline.
+    gzip: Whether to GZIP compress the output TFRecord. Read it back with
+      `TFRecordProvider(compression_type='GZIP')`.
   """
   pipeline_options = beam.options.pipeline_options.PipelineOptions(
       pipeline_options)
+  compression_type = (beam.io.filesystem.CompressionTypes.GZIP if gzip else
+                      beam.io.filesystem.CompressionTypes.UNCOMPRESSED)
   with beam.Pipeline(options=pipeline_options) as pipeline:
     examples = (
         pipeline
@@ -199,5 +204,6 @@ def prepare_tfrecord(
         | beam.io.tfrecordio.WriteToTFRecord(
             output_tfrecord_path,
             num_shards=num_shards,
-            coder=beam.coders.ProtoCoder(tf.train.Example))
+            coder=beam.coders.ProtoCoder(tf.train.Example),
+            compression_type=compression_type)
     )
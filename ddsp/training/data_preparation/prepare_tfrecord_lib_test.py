@@ -53,14 +53,18 @@ class ProcessTaskBeamTest(parameterized.TestCase):
             np.iinfo(np.int16).min, np.iinfo(np.int16).max,
             size=int(self.wav_sr * self.wav_secs), dtype=np.int16))
 
-  def parse_tfrecord(self, path):
+  def parse_tfrecord(self, path, compression_type=None):
     return [tf.train.Example.FromString(record.numpy()) for record in
-            tf.data.TFRecordDataset(os.path.join(self.test_dir, path))]
+            tf.data.TFRecordDataset(os.path.join(self.test_dir, path),
+                                    compression_type=compression_type)]
 
-  def validate_outputs(self, expected_num_examples, expected_feature_lengths):
+  def validate_outputs(self, expected_num_examples, expected_feature_lengths,
+                       compression_type=None):
     all_examples = (
-        self.parse_tfrecord('output.tfrecord-00000-of-00002') +
-        self.parse_tfrecord('output.tfrecord-00001-of-00002'))
+        self.parse_tfrecord('output.tfrecord-00000-of-00002',
+                            compression_type) +
+        self.parse_tfrecord('output.tfrecord-00001-of-00002',
+                            compression_type))
 
     self.assertLen(all_examples, expected_num_examples)
     for ex in all_examples:
@@ -138,6 +142,24 @@ class ProcessTaskBeamTest(parameterized.TestCase):
             'audio_crepe': int(self.wav_secs * _CREPE_SAMPLE_RATE)
         })
 
+  def test_prepare_tfrecord_gzip(self):
+    sample_rate = 16000
+    prepare_tfrecord_lib.prepare_tfrecord(
+        [self.wav_path],
+        os.path.join(self.test_dir, 'output.tfrecord'),
+        num_shards=2,
+        sample_rate=sample_rate,
+        frame_rate=None,
+        window_secs=None,
+        gzip=True)
+
+    self.validate_outputs(
+        1, {
+            'audio': int(self.wav_secs * sample_rate),
+            'audio_crepe': int(self.wav_secs * _CREPE_SAMPLE_RATE)
+        },
+        compression_type='GZIP')
+
 
 if __name__ == '__main__':
   absltest.main()
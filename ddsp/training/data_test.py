@@ -0,0 +1,215 @@
+# Copyright 2020 The DDSP Authors.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Lint as: python3
+"""Tests for ddsp.training.data."""
+
+import os
+from unittest import mock
+
+from ddsp.training import data
+import numpy as np
+import tensorflow.compat.v2 as tf
+
+
+class LegacyDataProvider(data.DataProvider):
+  """Old style provider with its own constructor and only get_dataset."""
+
+  def __init__(self, n_examples):  # pylint: disable=super-init-not-called
+    self._n_examples = n_examples
+
+  def get_dataset(self, shuffle=True):
+    return tf.data.Dataset.range(self._n_examples).map(lambda i: {'x': i})
+
+
+class DataProviderTest(tf.test.TestCase):
+
+  def test_get_batch_supports_legacy_providers(self):
+    n_examples, batch_size = 8, 4
+    dataset = LegacyDataProvider(n_examples).get_batch(batch_size,
+                                                       shuffle=False,
+                                                       repeats=1)
+    batches = list(dataset)
+    self.assertLen(batches, n_examples // batch_size)
+    self.assertAllEqual(np.arange(n_examples),
+                        np.concatenate([batch['x'] for batch in batches]))
+
+
+class LegacyTFRecordProvider(data.TFRecordProvider):
+  """Overrides get_dataset, as providers did before get_records existed."""
+
+  def get_dataset(self, shuffle=True):
+    dataset = super().get_dataset(shuffle)
+    return dataset.map(lambda ex: {'audio': 2.0 * ex['audio']})
+
+
+class TFRecordProviderTest(tf.test.TestCase):
+
+  def setUp(self):
+    """Write a small TFRecord where every feature of example i is i."""
+    super().setUp()
+    self.n_examples = 8
+    self.audio_length = 16
+    self.feature_length = 4
+    self.file_pattern = os.path.join(self.get_temp_dir(), 'test.tfrecord')
+    self.write_tfrecord(self.file_pattern)
+
+  def write_tfrecord(self, path, compression_type=None):
+    with tf.io.TFRecordWriter(path, options=compression_type) as writer:
+      for i in range(self.n_examples):
+        writer.write(self.make_example(i).SerializeToString())
+
+  def make_example(self, i):
+    lengths = {
+        'audio': self.audio_length,
+        'f0_hz': self.feature_length,
+        'f0_confidence': self.feature_length,
+        'loudness_db': self.feature_length,
+    }
+    return tf.train.Example(
+        features=tf.train.Features(
+            feature={
+                k: tf.train.Feature(
+                    float_list=tf.train.FloatList(value=[float(i)] * n))
+                for k, n in lengths.items()
+            }))
+
+  def get_provider(self, file_pattern=None, **kwargs):
+    # 1 second at 16 samples and 4 frames per second.
+    return data.TFRecordProvider(file_pattern or self.file_pattern,
+                                 example_secs=1,
+                                 sample_rate=self.audio_length,
+                                 frame_rate=self.feature_length,
+                                 **kwargs)
+
+  def validate_features(self, features, batch_shape):
+    self.assertSetEqual(set(['audio', 'f0_hz', 'f0_confidence', 'loudness_db']),
+                        set(features.keys()))
+    for key, feature in features.items():
+      length = self.audio_length if key == 'audio' else self.feature_length
+      self.assertEqual(tf.float32, feature.dtype)
+      self.assertEqual(batch_shape + [length], feature.shape.as_list())
+
+  def test_get_batch_has_static_shapes(self):
+    batch_size = 4
+    dataset = self.get_provider().get_batch(batch_size, shuffle=True)
+    self.validate_features(dataset.element_spec, [batch_size])
+    self.validate_features(next(iter(dataset)), [batch_size])
+
+  def test_get_batch_keeps_order_without_shuffle(self):
+    batch_size = 4
+    dataset = self.get_provider().get_batch(batch_size,
+                                            shuffle=False,
+                                            repeats=1)
+    audio = np.concatenate([batch['audio'][:, 0] for batch in dataset])
+    self.assertAllEqual(np.arange(self.n_examples), audio)
+
+  def test_get_dataset_returns_examples_in_order(self):
+    dataset = self.get_provider().get_dataset(shuffle=False)
+    self.validate_features(dataset.element_spec, [])
+    examples = list(dataset)
+    self.assertLen(examples, self.n_examples)
+    for i, ex in enumerate(examples):
+      self.validate_features(ex, [])
+      self.assertAllEqual(np.full([self.feature_length], i), ex['f0_hz'])
+
+  def test_reads_gzip_tfrecord(self):
+    file_pattern = os.path.join(self.get_temp_dir(), 'test_gzip.tfrecord')
+    self.write_tfrecord(file_pattern, compression_type='GZIP')
+    provider = self.get_provider(file_pattern, compression_type='GZIP')
+    dataset = provider.get_batch(self.n_examples, shuffle=False, repeats=1)
+    batch = next(iter(dataset))
+    self.validate_features(batch, [self.n_examples])
+    self.assertAllEqual(np.arange(self.n_examples), batch['audio'][:, 0])
+
+  def test_get_batch_uses_overridden_get_dataset(self):
+    batch_size = 4
+    provider = LegacyTFRecordProvider(self.file_pattern,
+                                      example_secs=1,
+                                      sample_rate=self.audio_length,
+                                      frame_rate=self.feature_length)
+    dataset = provider.get_batch(batch_size, shuffle=False, repeats=1)
+    batches = list(dataset)
+    for batch in batches:
+      self.assertSetEqual(set(['audio']), set(batch.keys()))
+      self.assertEqual([batch_size, self.audio_length],
+                       batch['audio'].shape.as_list())
+    audio = np.concatenate([batch['audio'][:, 0] for batch in batches])
+    self.assertAllEqual(2.0 * np.arange(self.n_examples), audio)
+
+  def test_get_batch_sets_ram_budget(self):
+    ram_budget = 256 * 1024 * 1024
+    dataset = self.get_provider(ram_budget=ram_budget).get_batch(4)
+    self.assertEqual(ram_budget, dataset.options().autotune.ram_budget)
+
+
+class NSynthTfdsTest(tf.test.TestCase):
+
+  def test_preprocess_fn_handles_batches(self):
+    batch_size, n_samples, n_frames = 2, 16, 4
+    ex = {
+        'pitch': tf.zeros([batch_size], tf.int64),
+        'audio': tf.zeros([batch_size, n_samples]),
+        'instrument': {
+            'source': tf.zeros([batch_size], tf.int64),
+            'family': tf.zeros([batch_size], tf.int64),
+            'label': tf.zeros([batch_size], tf.int64),
+        },
+        'f0': {
+            'hz': tf.zeros([batch_size, n_frames]),
+            'confidence': tf.zeros([batch_size, n_frames]),
+        },
+        'loudness': {
+            'db': tf.zeros([batch_size, n_frames]),
+        },
+    }
+    provider = data.NSynthTfds(data_dir=self.get_temp_dir())
+    features = provider.get_preprocess_fn()(ex)
+
+    self.assertSetEqual(
+        set(['pitch', 'audio', 'instrument_source', 'instrument_family',
+             'instrument', 'f0_hz', 'f0_confidence', 'loudness_db']),
+        set(features.keys()))
+    self.assertEqual([batch_size, n_samples], features['audio'].shape)
+    self.assertEqual([batch_size, n_frames], features['f0_hz'].shape)
+    self.assertEqual([batch_size], features['instrument'].shape)
+
+
+class TfdsProviderTest(tf.test.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.cache_path = os.path.join(self.get_temp_dir(), 'cache')
+    self.provider = data.TfdsProvider('dummy', 'train', self.get_temp_dir(),
+                                      cache_path=self.cache_path)
+    # Stand in for tfds.load with a small in-memory dataset.
+    patcher = mock.patch.object(data.tfds, 'load',
+                                return_value=tf.data.Dataset.range(4))
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def test_caches_shuffled_records(self):
+    self.assertAllEqual([0, 1, 2, 3], list(self.provider.get_records(True)))
+    self.assertNotEmpty(tf.io.gfile.glob(self.cache_path + '*'))
+
+  def test_ignores_cache_path_without_shuffle(self):
+    with mock.patch.object(data.logging, 'warning') as warning:
+      records = list(self.provider.get_records(False))
+    self.assertAllEqual([0, 1, 2, 3], records)
+    warning.assert_called_once()
+    self.assertEmpty(tf.io.gfile.glob(self.cache_path + '*'))
+
+
+if __name__ == '__main__':
+  tf.test.main()